@@ -1,9 +1,31 @@
 import streamlit as st
 import re
-import json
+import codecs
 import requests
 from datetime import datetime
-import xml.etree.ElementTree as ET
+from itertools import islice
+
+# lxml (implémentation C) si disponible, sinon la bibliothèque standard
+try:
+    from lxml import etree as ET
+    _HAS_LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    _HAS_LXML = False
+
+# Expressions régulières compilées une seule fois au chargement du module
+# OrderId/IdValue recherchés directement sur les octets bruts, sans décodage
+_ORDER_ID_RE_B = re.compile(
+    rb'<OrderId[^>]*>\s*<IdValue>([^<]+)</IdValue>', re.IGNORECASE
+)
+# Encodage déclaré dans l'en-tête <?xml ... encoding="..."?>
+_XML_ENCODING_RE = re.compile(
+    rb'<\?xml[^>]{0,256}?encoding\s{0,16}=\s{0,16}["\']([A-Za-z0-9._-]{1,40})["\']'
+)
+_COST_CENTER_RE = re.compile(r'(<CostCenterName>[^<]*</CostCenterName>)')
+
+# Taille maximale acceptée pour un fichier XML, vérifiée avant tout parsing
+MAX_XML_BYTES = 50 * 1024 * 1024  # 50 Mo
 
 # Configuration de la page
 st.set_page_config(
@@ -12,19 +34,73 @@ st.set_page_config(
     layout="wide"
 )
 
+def _norm_order_id(order_id):
+    """Normalise un numéro de commande avec des zéros de tête (721 -> 000721)"""
+    # Cas courant: déjà au format 000721, aucun test de chiffres nécessaire
+    if len(order_id) >= 6:
+        return order_id
+    if order_id.isdigit():
+        return order_id.zfill(6)
+    return order_id
+
+def _is_single_byte(encoding):
+    """Vrai si l'encodage décode chaque octet isolément (iso-8859-1, cp1252...)"""
+    try:
+        # Un encodage multi-octets attend la suite de la séquence et ne renvoie rien
+        decoder = codecs.getincrementaldecoder(encoding)()
+        return len(decoder.decode(b'\xe9', final=False)) == 1
+    except (LookupError, UnicodeDecodeError):
+        return False
+
 def detect_and_decode(file_bytes):
-    """Detecte l'encodage et decode le fichier"""
-    encodings = ['utf-8', 'utf-8-sig', 'iso-8859-1', 'cp1252', 'latin1']
+    """Detecte l'encodage et decode le fichier en un seul passage"""
+    # Cas le plus fréquent (fichiers PIXID): pur ASCII, vérifié en C sans exception
+    if file_bytes.isascii():
+        return file_bytes.decode('ascii'), 'ascii'
     
-    for encoding in encodings:
+    # BOM UTF-8 explicite
+    if file_bytes[:3] == b'\xef\xbb\xbf':
         try:
-            content = file_bytes.decode(encoding)
-            return content, encoding
+            return file_bytes[3:].decode('utf-8'), 'utf-8-sig'
         except UnicodeDecodeError:
-            continue
+            pass
+    
+    # UTF-8: un échec s'arrête au premier octet invalide
+    try:
+        return file_bytes.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    
+    # Encodage annoncé par la déclaration XML, seulement s'il est sur un octet
+    # (iso-8859-15, cp1252...): un UTF-16 annoncé à tort décoderait sans erreur
+    declaration = _XML_ENCODING_RE.match(file_bytes)
+    if declaration:
+        encoding = declaration.group(1).decode('ascii').lower()
+        if _is_single_byte(encoding):
+            try:
+                return file_bytes.decode(encoding), encoding
+            except UnicodeDecodeError:
+                pass
     
-    content = file_bytes.decode('utf-8', errors='replace')
-    return content, 'utf-8-with-errors'
+    # iso-8859-1 accepte n'importe quelle séquence d'octets
+    return file_bytes.decode('iso-8859-1'), 'iso-8859-1'
+
+def decode_preview(head_bytes):
+    """Decode le début d'un fichier, même coupé au milieu d'un caractère UTF-8"""
+    try:
+        # Le décodeur incrémental ignore une séquence UTF-8 incomplète en fin de tampon
+        return codecs.getincrementaldecoder('utf-8-sig')().decode(head_bytes, final=False)
+    except UnicodeDecodeError:
+        # Encodage sur un octet (iso-8859-1, cp1252...): pas de coupure possible
+        preview, _ = detect_and_decode(head_bytes)
+        return preview
+
+@st.cache_resource
+def _session():
+    """Session HTTP réutilisée entre les rechargements (keep-alive)"""
+    session = requests.Session()
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+    return session
 
 @st.cache_data(ttl=300)  # Cache pendant 5 minutes
 def load_corrections():
@@ -32,124 +108,297 @@ def load_corrections():
     try:
         # URL corrigée du fichier corrections.json
         url = "https://raw.githubusercontent.com/younessemlali/xpo-xml-auto-corrector/main/corrections.json"
-        response = requests.get(url, timeout=10)
         
-        if response.status_code == 200:
-            corrections = json.loads(response.text)
-            # Normaliser les clés pour s'assurer qu'elles ont des zéros de tête
-            normalized_corrections = {}
-            for order_id, data in corrections.items():
-                # Normaliser la clé (ajouter des zéros si nécessaire)
-                if order_id and order_id.isdigit() and len(order_id) < 6:
-                    normalized_key = order_id.zfill(6)
-                else:
-                    normalized_key = order_id
-                normalized_corrections[normalized_key] = data
-            return normalized_corrections
-        else:
-            st.error(f"❌ Erreur GitHub: {response.status_code}")
-            return {}
+        # Requête conditionnelle: GitHub répond 304 si le fichier n'a pas changé
+        headers = {}
+        if '_corr_etag' in st.session_state and '_corr_data' in st.session_state:
+            headers['If-None-Match'] = st.session_state['_corr_etag']
+        response = _session().get(url, headers=headers, timeout=10)
+        
+        if response.status_code == 304:
+            return st.session_state['_corr_data']
+        response.raise_for_status()
+        
+        # Parser directement les octets reçus, sans passer par response.text
+        corrections = response.json()
+        # Normaliser les clés une fois pour toutes et figer les champs
+        # en tuples (champ, valeur) parcourus directement à l'application
+        normalized_corrections = {
+            _norm_order_id(order_id): tuple(data.items())
+            for order_id, data in corrections.items()
+        }
+        
+        # Conserver le résultat normalisé pour les réponses 304
+        if response.headers.get('ETag'):
+            st.session_state['_corr_etag'] = response.headers['ETag']
+            st.session_state['_corr_data'] = normalized_corrections
+        return normalized_corrections
+    except requests.HTTPError as e:
+        st.error(f"❌ Erreur GitHub: {e.response.status_code}")
+        return {}
     except Exception as e:
         st.error(f"❌ Erreur de connexion: {str(e)}")
         return {}
 
-def extract_all_order_numbers(xml_content):
-    """Extrait TOUS les numéros de commande du XML (support multi-contrats)"""
+def _iter_order_id_elems(xml_source):
+    """Parcourt les balises OrderId avec leurs ancêtres ouverts (bibliothèque standard)"""
+    # ElementTree ne connaît pas le parent d'un élément: suivre la pile des balises ouvertes
+    open_elems = []
+    for event, elem in ET.iterparse(xml_source, events=('start', 'end')):
+        if event == 'start':
+            open_elems.append(elem)
+            continue
+        open_elems.pop()
+        if elem.tag.rsplit('}', 1)[-1] == 'OrderId':
+            yield elem, open_elems
+
+@st.cache_data(max_entries=32, show_spinner=False)  # Réutilisé à chaque rerun Streamlit
+def extract_all_order_numbers(xml_source):
+    """Extrait TOUS les numéros de commande d'un fichier XML lu en flux (support multi-contrats)"""
     order_numbers = []
+    seen = set()  # Déduplication en O(1) tout en conservant l'ordre
     
     try:
-        # Méthode 1: Regex pour chercher toutes les balises OrderId avec IdValue
-        pattern = r'<OrderId[^>]*>\s*<IdValue>([^<]+)</IdValue>'
-        matches = re.findall(pattern, xml_content, re.IGNORECASE)
-        
-        for match in matches:
-            order_id = match.strip()
-            # Normaliser avec des zéros de tête si nécessaire
-            if order_id.isdigit() and len(order_id) < 6:
-                order_id = order_id.zfill(6)
-            if order_id not in order_numbers:
-                order_numbers.append(order_id)
-        
-        # Méthode 2: XML parsing comme fallback
-        if not order_numbers:
-            try:
-                root = ET.fromstring(xml_content)
-                for order_id_elem in root.iter():
-                    if 'OrderId' in str(order_id_elem.tag):
-                        id_value = order_id_elem.find('.//IdValue')
-                        if id_value is not None and id_value.text:
-                            order_id = id_value.text.strip()
-                            # Normaliser avec des zéros de tête si nécessaire
-                            if order_id.isdigit() and len(order_id) < 6:
-                                order_id = order_id.zfill(6)
-                            if order_id not in order_numbers:
-                                order_numbers.append(order_id)
-            except ET.ParseError:
-                pass
+        # Méthode 1: parsing XML en flux, un seul passage sur le document
+        try:
+            if _HAS_LXML:
+                # lxml filtre directement les balises OrderId côté C
+                order_id_elems = (
+                    (elem, elem.iterancestors()) for event, elem in ET.iterparse(
+                        xml_source, events=('end',), tag='{*}OrderId', huge_tree=False,
+                        resolve_entities=False, no_network=True
+                    )
+                )
+            else:
+                order_id_elems = _iter_order_id_elems(xml_source)
+            for elem, ancestors in order_id_elems:
+                id_value = elem.find('./{*}IdValue')
+                if id_value is not None and id_value.text:
+                    order_id = _norm_order_id(id_value.text.strip())
+                    if order_id not in seen:
+                        seen.add(order_id)
+                        order_numbers.append(order_id)
+                elem.clear()
+                # Détacher les éléments déjà lus: chaque ancêtre ouvert ne garde
+                # que son dernier enfant, celui qui mène à l'OrderId courant
+                for ancestor in ancestors:
+                    del ancestor[:-1]
+        except ET.ParseError:
+            # Méthode 2: Regex en dernier recours si le XML est mal formé
+            order_numbers = []
+            seen = set()
+            xml_source.seek(0)
+            for match in _ORDER_ID_RE_B.finditer(xml_source.read()):
+                order_id, _ = detect_and_decode(match.group(1))
+                order_id = _norm_order_id(order_id.strip())
+                if order_id not in seen:
+                    seen.add(order_id)
+                    order_numbers.append(order_id)
         
-        return order_numbers
+        # Tuple immuable: la valeur est partagée par le cache entre les reruns
+        return tuple(order_numbers)
     except Exception:
-        return []
+        return ()
 
 def add_customer_job_code(xml_content, job_code):
     """Ajoute la balise CustomerJobCode après CostCenterName"""
     try:
         # Vérifier si CustomerJobCode existe déjà
-        if '<CustomerJobCode>' in xml_content:
-            # Remplacer la valeur existante
-            xml_content = re.sub(
-                r'<CustomerJobCode>[^<]*</CustomerJobCode>',
-                f'<CustomerJobCode>{job_code}</CustomerJobCode>',
-                xml_content
-            )
-            return xml_content, "mise_a_jour"
+        start = xml_content.find('<CustomerJobCode>')
+        if start != -1:
+            # Remplacer la valeur existante par découpage, sans moteur regex
+            parts = []
+            position = 0
+            while start != -1:
+                end = xml_content.find('</CustomerJobCode>', start)
+                if end == -1:
+                    break
+                parts.append(xml_content[position:start])
+                parts.append(f'<CustomerJobCode>{job_code}</CustomerJobCode>')
+                position = end + len('</CustomerJobCode>')
+                start = xml_content.find('<CustomerJobCode>', position)
+            parts.append(xml_content[position:])
+            return ''.join(parts), "mise_a_jour"
         else:
             # Pattern pour trouver CostCenterName et ajouter CustomerJobCode juste après
-            pattern = r'(<CostCenterName>[^<]*</CostCenterName>)'
             replacement = f'\\1\n        <CustomerJobCode>{job_code}</CustomerJobCode>'
             
             # Compter les occurrences pour s'assurer qu'on fait la substitution
-            matches = re.findall(pattern, xml_content)
+            matches = _COST_CENTER_RE.findall(xml_content)
             if matches:
-                xml_content = re.sub(pattern, replacement, xml_content)
+                xml_content = _COST_CENTER_RE.sub(replacement, xml_content)
                 return xml_content, "ajout"
             else:
                 # Si CostCenterName n'est pas trouvé, essayer d'autres emplacements
-                # Chercher après <OrderId>...</OrderId>
-                order_pattern = r'(<OrderId[^>]*>.*?</OrderId>)'
-                if re.search(order_pattern, xml_content, re.DOTALL):
-                    order_replacement = f'\\1\n        <CustomerJobCode>{job_code}</CustomerJobCode>'
-                    xml_content = re.sub(order_pattern, order_replacement, xml_content, flags=re.DOTALL)
-                    return xml_content, "ajout_alternatif"
+                # Chercher après <OrderId>...</OrderId>, par str.find (linéaire)
+                parts = []
+                position = 0
+                start = xml_content.find('<OrderId')
+                while start != -1:
+                    end = xml_content.find('</OrderId>', start)
+                    if end == -1:
+                        break
+                    end += len('</OrderId>')
+                    parts.append(xml_content[position:end])
+                    parts.append(f'\n        <CustomerJobCode>{job_code}</CustomerJobCode>')
+                    position = end
+                    start = xml_content.find('<OrderId', position)
+                if parts:
+                    parts.append(xml_content[position:])
+                    return ''.join(parts), "ajout_alternatif"
                 else:
                     return xml_content, "emplacement_non_trouve"
     
     except Exception as e:
         return xml_content, f"erreur: {str(e)}"
 
-def apply_corrections_to_xml(xml_content, order_numbers, corrections):
-    """Applique les corrections pour toutes les commandes détectées"""
+def _correction_message(order_number, job_code, status):
+    """Libellé affiché pour une correction CustomerJobCode"""
+    if status in ["ajout", "mise_a_jour", "ajout_alternatif"]:
+        return f"Commande {order_number} - CustomerJobCode: {job_code} ({status.replace('_', ' ')})"
+    return f"Commande {order_number} - CustomerJobCode: ÉCHEC ({status})"
+
+def _order_scopes(root, order_numbers):
+    """Associe chaque commande demandée aux plus grands sous-arbres qui ne concernent qu'elle"""
+    order_id_elems = {}
+    order_ids_below = {}
+    for order_id_elem in root.iter('{*}OrderId'):
+        id_value = order_id_elem.find('./{*}IdValue')
+        if id_value is None or not id_value.text:
+            continue
+        order_id = _norm_order_id(id_value.text.strip())
+        order_id_elems.setdefault(order_id, []).append(order_id_elem)
+        order_ids_below.setdefault(order_id_elem, set()).add(order_id)
+        for ancestor in order_id_elem.iterancestors():
+            order_ids_below.setdefault(ancestor, set()).add(order_id)
+    
+    scopes = {}
+    shared_by_parent = {}  # Calculé une seule fois par parent
+    for order_id in order_numbers:
+        order_scopes = []
+        for order_id_elem in order_id_elems.get(order_id, []):
+            # Remonter tant que l'ancêtre ne contient que cette commande
+            scope = order_id_elem
+            parent = scope.getparent()
+            while parent is not None and order_ids_below[parent] == {order_id}:
+                scope = parent
+                parent = scope.getparent()
+            # Portée réduite à OrderId: les balises CustomerJobCode/CostCenterName
+            # voisines (hors autres commandes) sont communes à plusieurs commandes
+            shared = False
+            if scope is order_id_elem and parent is not None:
+                if parent not in shared_by_parent:
+                    shared_by_parent[parent] = any(
+                        next(sibling.iter('{*}CustomerJobCode', '{*}CostCenterName'), None) is not None
+                        for sibling in parent if sibling not in order_ids_below
+                    )
+                shared = shared_by_parent[parent]
+            if all(scope is not known for known, _, _ in order_scopes):
+                order_scopes.append((scope, order_id_elem, shared))
+        scopes[order_id] = order_scopes
+    return scopes
+
+def _set_customer_job_code(scope, order_id_elem, shared, job_code):
+    """Met à jour ou insère CustomerJobCode dans le sous-arbre d'une commande"""
+    try:
+        if shared:
+            # Ne pas ajouter de doublon à côté de balises communes à plusieurs commandes
+            return "balise_partagee_entre_commandes"
+        
+        existing = list(scope.iter('{*}CustomerJobCode'))
+        if existing:
+            for job_code_elem in existing:
+                job_code_elem.text = job_code
+            return "mise_a_jour"
+        
+        # Insérer après CostCenterName, sinon après OrderId
+        anchors = list(scope.iter('{*}CostCenterName'))
+        status = "ajout"
+        if not anchors:
+            anchors = [order_id_elem]
+            status = "ajout_alternatif"
+        
+        for anchor in anchors:
+            namespace = ET.QName(anchor).namespace
+            job_code_elem = anchor.makeelement(
+                f'{{{namespace}}}CustomerJobCode' if namespace else 'CustomerJobCode'
+            )
+            job_code_elem.text = job_code
+            # Reprendre l'indentation de la balise de référence
+            previous = anchor.getprevious()
+            indent = previous.tail if previous is not None else anchor.getparent().text
+            job_code_elem.tail = anchor.tail
+            if indent and not indent.strip():
+                anchor.tail = indent
+            anchor.addnext(job_code_elem)
+        return status
+    
+    except Exception as e:
+        return f"erreur: {str(e)}"
+
+def _apply_corrections_to_tree(file_bytes, order_numbers, corrections):
+    """Applique toutes les corrections en un seul parsing et une seule sérialisation"""
+    # Entités externes jamais résolues, quelle que soit la version de lxml
+    parser = ET.XMLParser(huge_tree=False, resolve_entities=False, no_network=True)
+    root = ET.fromstring(file_bytes, parser)
+    scopes = _order_scopes(root, order_numbers)
     all_applied_corrections = []
-    corrected_xml = xml_content
     
     for order_number in order_numbers:
-        if order_number in corrections:
-            order_corrections = corrections[order_number]
-            
-            for field, value in order_corrections.items():
-                if field == "CustomerJobCode":
-                    corrected_xml, status = add_customer_job_code(corrected_xml, value)
-                    if status in ["ajout", "mise_a_jour", "ajout_alternatif"]:
-                        all_applied_corrections.append(
-                            f"Commande {order_number} - CustomerJobCode: {value} ({status.replace('_', ' ')})"
-                        )
-                    else:
-                        all_applied_corrections.append(
-                            f"Commande {order_number} - CustomerJobCode: ÉCHEC ({status})"
-                        )
-                # Ici on peut ajouter d'autres types de corrections
+        for field, value in corrections[order_number]:
+            if field == "CustomerJobCode":
+                statuses = [
+                    _set_customer_job_code(scope, order_id_elem, shared, value)
+                    for scope, order_id_elem, shared in scopes.get(order_number, [])
+                ] or ["emplacement_non_trouve"]
+                for status in dict.fromkeys(statuses):
+                    all_applied_corrections.append(
+                        _correction_message(order_number, value, status)
+                    )
+            # Ici on peut ajouter d'autres types de corrections
     
-    return corrected_xml, all_applied_corrections
+    # Sérialiser directement en ISO-8859-1 pour le téléchargement, avec la
+    # déclaration XML correspondante (standalone conservé) et sans passer par
+    # une chaîne Python. Les sections CDATA ressortent en texte échappé et
+    # <X></X> devient <X/>.
+    tree = root.getroottree()
+    xml_bytes = ET.tostring(
+        tree, encoding='iso-8859-1', xml_declaration=True,
+        # lxml renvoie False aussi sans attribut standalone: ne pas l'inventer
+        standalone=tree.docinfo.standalone or None
+    )
+    return xml_bytes, all_applied_corrections, tree.docinfo.encoding or 'utf-8'
+
+def apply_corrections_to_xml(file_bytes, order_numbers, corrections):
+    """Applique les corrections pour toutes les commandes détectées"""
+    # Rien à corriger: renvoyer le fichier tel quel, sans parsing ni décodage
+    hits = [order_number for order_number in order_numbers if order_number in corrections]
+    if not hits:
+        return file_bytes, [], None
+    
+    if _HAS_LXML:
+        try:
+            return _apply_corrections_to_tree(file_bytes, hits, corrections)
+        except ET.ParseError:
+            pass
+    
+    # Repli sans lxml ou sur XML mal formé: substitutions textuelles
+    corrected_xml, xml_encoding = detect_and_decode(file_bytes)
+    all_applied_corrections = []
+    
+    for order_number in hits:
+        for field, value in corrections[order_number]:
+            if field == "CustomerJobCode":
+                corrected_xml, status = add_customer_job_code(corrected_xml, value)
+                all_applied_corrections.append(
+                    _correction_message(order_number, value, status)
+                )
+            # Ici on peut ajouter d'autres types de corrections
+    
+    # Réencoder avec l'encodage de lecture: les octets d'origine et la
+    # déclaration XML restent cohérents (caractères hors encodage en &#...;)
+    xml_bytes = corrected_xml.encode(xml_encoding, errors='xmlcharrefreplace')
+    return xml_bytes, all_applied_corrections, xml_encoding
 
 def main():
     """Interface principale"""
@@ -167,9 +416,9 @@ def main():
         
         # Afficher un aperçu des corrections disponibles
         with st.expander("📋 Aperçu des corrections disponibles"):
-            for order_num, order_corrections in list(corrections.items())[:5]:
+            for order_num, order_corrections in islice(corrections.items(), 5):
                 st.write(f"**Commande {order_num}:**")
-                for field, value in order_corrections.items():
+                for field, value in order_corrections:
                     st.write(f"  • {field}: `{value}`")
             if len(corrections) > 5:
                 st.write(f"... et {len(corrections) - 5} autres commandes")
@@ -184,16 +433,20 @@ def main():
     xml_file = st.file_uploader(
         "Choisissez votre fichier XML à corriger",
         type=['xml'],
-        help="Le fichier sera automatiquement corrigé selon les données disponibles. Support multi-contrats."
+        help=f"Le fichier sera automatiquement corrigé selon les données disponibles. Support multi-contrats. Taille maximale: {MAX_XML_BYTES // (1024 * 1024)} Mo."
     )
     
-    if xml_file is not None:
-        # Lire le fichier XML
-        xml_content, xml_encoding = detect_and_decode(xml_file.read())
-        st.success(f"✅ XML lu avec l'encodage: {xml_encoding}")
-        
-        # Extraire TOUS les numéros de commande
-        order_numbers = extract_all_order_numbers(xml_content)
+    if xml_file is not None and xml_file.size > MAX_XML_BYTES:
+        # Refuser les fichiers trop volumineux avant toute lecture
+        st.error(f"❌ Fichier trop volumineux: {xml_file.size / (1024 * 1024):.1f} Mo (maximum {MAX_XML_BYTES // (1024 * 1024)} Mo)")
+        st.info("💡 Découpez le fichier en plusieurs XML plus petits")
+    
+    elif xml_file is not None:
+        # Extraire TOUS les numéros de commande en lisant le fichier en flux:
+        # les éléments déjà lus sont libérés au fur et à mesure, et le contenu
+        # complet n'est copié qu'au moment d'appliquer
+        xml_file.seek(0)
+        order_numbers = extract_all_order_numbers(xml_file)
         
         if order_numbers:
             st.info(f"🏷️ Numéro(s) de commande détecté(s): **{', '.join(order_numbers)}**")
@@ -215,16 +468,19 @@ def main():
                 st.write("**Corrections à appliquer:**")
                 for order_num, order_corrections in available_corrections.items():
                     st.write(f"📋 **Commande {order_num}:**")
-                    for field, value in order_corrections.items():
+                    for field, value in order_corrections:
                         st.write(f"  • **{field}**: `{value}`")
                 
                 # Bouton pour appliquer les corrections
                 if st.button("🔄 Appliquer les corrections", type="primary"):
                     with st.spinner("🔧 Application des corrections..."):
-                        corrected_xml, applied_corrections = apply_corrections_to_xml(
-                            xml_content, order_numbers, corrections
+                        xml_bytes, applied_corrections, xml_encoding = apply_corrections_to_xml(
+                            xml_file.getvalue(), order_numbers, corrections
                         )
                     
+                    if xml_encoding:
+                        st.success(f"✅ XML lu avec l'encodage: {xml_encoding}")
+                    
                     if applied_corrections:
                         st.success("✅ Corrections appliquées avec succès!")
                         
@@ -240,12 +496,6 @@ def main():
                         timestamp = datetime.now().strftime('%H%M%S')
                         filename = f"{xml_file.name.split('.')[0]}_corrected_{timestamp}.xml"
                         
-                        # Encoder en ISO-8859-1 pour le téléchargement
-                        try:
-                            xml_bytes = corrected_xml.encode('iso-8859-1', errors='replace')
-                        except:
-                            xml_bytes = corrected_xml.encode('utf-8', errors='replace')
-                        
                         st.download_button(
                             label="📥 Télécharger le XML corrigé",
                             data=xml_bytes,
@@ -265,7 +515,9 @@ def main():
             
             # Afficher un aperçu du XML pour debug
             with st.expander("🔍 Aperçu du contenu XML (pour debug)"):
-                st.text(xml_content[:1000] + "..." if len(xml_content) > 1000 else xml_content)
+                xml_file.seek(0)
+                preview = decode_preview(xml_file.read(1000))
+                st.text(preview + "..." if xml_file.size > 1000 else preview)
     
     # Informations sur le système
     st.write("---")